@@ -1,7 +1,13 @@
 import ffmpeg
+import os
 from pathlib import Path
 from PIL import Image
 import tempfile
+import time
+import uuid
+
+# Output file suffix for each supported animation format
+FORMAT_SUFFIXES = {"gif": ".gif", "webp": ".webp", "apng": ".png", "mp4": ".mp4"}
 
 
 def mp4_to_gif(
@@ -16,14 +22,21 @@ def mp4_to_gif(
     generate_individual: bool = True,
     rows: int = 1,
     cols: int = 1,
+    format: str = "gif",
 ):
+    if format not in FORMAT_SUFFIXES:
+        raise ValueError(
+            f"Invalid format. Choose one of {', '.join(FORMAT_SUFFIXES)}."
+        )
+
     input_folder = Path(input_folder)
     output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
 
+    output_paths = []
     if generate_individual:
         for mp4_file in input_folder.glob("*.mp4"):
-            convert_single_mp4_to_gif(
+            output_path = convert_single_mp4_to_gif(
                 mp4_file,
                 output_folder,
                 fps,
@@ -32,11 +45,14 @@ def mp4_to_gif(
                 loop,
                 hold_last_frame,
                 frame_duration,
+                format,
             )
+            if output_path:
+                output_paths.append(output_path)
     else:
         output_folder_merge = output_folder / "merge"
         output_folder_merge.mkdir(parents=True, exist_ok=True)
-        mp4_to_merged_gif(
+        output_path = mp4_to_merged_gif(
             input_folder,
             output_folder_merge,
             fps,
@@ -47,7 +63,11 @@ def mp4_to_gif(
             frame_duration,
             rows,
             cols,
+            format,
         )
+        output_paths.append(output_path)
+
+    return output_paths
 
 
 def mp4_to_merged_gif(
@@ -61,6 +81,7 @@ def mp4_to_merged_gif(
     frame_duration: int,
     rows: int,
     cols: int,
+    format: str = "gif",
 ):
     input_folder = Path(input_folder)
     output_folder = Path(output_folder)
@@ -80,12 +101,37 @@ def mp4_to_merged_gif(
     # Extract frames from each MP4 file and load into memory
     for mp4_file in mp4_files:
         frames, durations, last_frame = extract_frames_from_mp4(
-            mp4_file, fps, scale, colors, frame_duration, hold_last_frame
+            mp4_file, fps, scale, colors, frame_duration, hold_last_frame, format
         )
+        if not frames:
+            raise ValueError(f"No frames could be extracted from {mp4_file}.")
         all_frames.append(frames)
         all_durations.append(durations)
         last_frames.append(last_frame)  # Collect the last frame of each video
 
+    return save_merged_gif(
+        all_frames,
+        all_durations,
+        output_folder,
+        loop,
+        hold_last_frame,
+        rows,
+        cols,
+        format,
+    )
+
+
+def save_merged_gif(
+    all_frames,
+    all_durations,
+    output_folder,
+    loop,
+    hold_last_frame,
+    rows,
+    cols,
+    format="gif",
+):
+    output_folder = Path(output_folder)
     max_frames = max(len(frames) for frames in all_frames)
     grid_frames = []
     grid_durations = []
@@ -102,8 +148,11 @@ def mp4_to_merged_gif(
         grid_height = grid_frame_images[0].height * rows
         grid_image = Image.new("RGBA", (grid_width, grid_height))
 
+        # Fewer videos than cells leaves the remaining cells empty
         for r in range(rows):
             for c in range(cols):
+                if r * cols + c >= len(grid_frame_images):
+                    break
                 img = grid_frame_images[r * cols + c]
                 grid_image.paste(img, (c * img.width, r * img.height))
 
@@ -115,17 +164,12 @@ def mp4_to_merged_gif(
 
     output_path = (
         output_folder
-        / f"merged_{rows * cols}_gifs_hold_{int(hold_last_frame*1000)}ms.gif"
-    )
-    grid_frames[0].save(
-        output_path,
-        save_all=True,
-        append_images=grid_frames[1:],
-        duration=grid_durations,
-        loop=loop,
+        / f"merged_{rows * cols}_{format}s_hold_{int(hold_last_frame*1000)}ms{FORMAT_SUFFIXES[format]}"
     )
+    save_animation(grid_frames, grid_durations, output_path, loop, format)
 
-    print(f"Successfully created merged GIF grid! Saved to {output_path}")
+    print(f"Successfully created merged {format.upper()} grid! Saved to {output_path}")
+    return output_path
 
 
 def convert_single_mp4_to_gif(
@@ -137,32 +181,188 @@ def convert_single_mp4_to_gif(
     loop: int,
     hold_last_frame: float,
     frame_duration: int,
+    format: str = "gif",
 ):
     base_name = mp4_path.stem
-    output_path = os.path.join(output_folder, f"{base_name}.gif")
+    output_path = os.path.join(output_folder, f"{base_name}{FORMAT_SUFFIXES[format]}")
 
-    with tempfile.NamedTemporaryFile(suffix=".gif", delete=True) as temp_gif:
-        try:
+    try:
+        encode_single_mp4(
+            mp4_path,
+            output_path,
+            fps,
+            scale,
+            colors,
+            loop,
+            hold_last_frame,
+            frame_duration,
+            format,
+        )
+        print(
+            f"Single {format.upper()} generated successfully! Saved to {output_path}"
+        )
+        return output_path
+    except ffmpeg.Error as e:
+        print(f"Conversion failed: {e.stderr.decode()}")
+    except (ValueError, OSError) as e:
+        print(f"Conversion failed: {e}")
+
+
+def encode_single_mp4(
+    mp4_path,
+    output_path,
+    fps,
+    scale,
+    colors,
+    loop,
+    hold_last_frame,
+    frame_duration,
+    format="gif",
+):
+    # Write one MP4 as an animation and return its frames and durations, or
+    # (None, None) for the MP4 preview, which is transcoded without decoding
+    if format == "gif":
+        with tempfile.NamedTemporaryFile(suffix=".gif", delete=True) as temp_gif:
             ffmpeg.input(str(mp4_path), r=fps).output(
                 temp_gif.name,
-                vf=f"fps={fps},scale={scale}:-1:flags=lanczos,split[s0][s1];[s0]palettegen=max_colors={colors}[p];[s1][p]paletteuse=dither=bayer:bayer_scale=5",
+                vf=gif_filter(fps, scale, colors),
                 loop=loop,
             ).run(quiet=True, overwrite_output=True)
 
             frames, durations, last_frame = load_frames_from_gif(
                 temp_gif.name, frame_duration, hold_last_frame
             )
+    elif format == "mp4":
+        temp_path = temp_output_path(output_path)
+        try:
+            transcode_mp4_preview(
+                mp4_path, temp_path, fps, scale, hold_last_frame, frame_duration
+            )
+            os.replace(temp_path, output_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return None, None
+    else:
+        frames, durations = load_frames_from_mp4(
+            mp4_path, fps, scale, frame_duration, hold_last_frame
+        )
+        if not frames:
+            raise ValueError(f"no frames decoded from {mp4_path}")
+
+    save_animation(frames, durations, output_path, loop, format)
+    return frames, durations
 
+
+def temp_output_path(output_path):
+    # Hidden file next to output_path, so os.replace swaps it in atomically and
+    # readers never see a half-written file; the suffix keeps the format
+    output_path = Path(output_path)
+    return output_path.with_name(
+        f".{output_path.stem}.{uuid.uuid4().hex}.tmp{output_path.suffix}"
+    )
+
+
+def save_animation(frames, durations, output_path, loop, format="gif"):
+    temp_path = temp_output_path(output_path)
+    try:
+        if format == "mp4":
+            save_mp4_preview(frames, durations, temp_path)
+        else:
+            save_kwargs = {}
+            if format == "webp":
+                # Lossy, mid effort for encode speed
+                save_kwargs = dict(quality=80, method=4)
             frames[0].save(
-                output_path,
+                temp_path,
+                format={"gif": "GIF", "webp": "WEBP", "apng": "PNG"}[format],
                 save_all=True,
                 append_images=frames[1:],
                 duration=durations,
                 loop=loop,
+                **save_kwargs,
             )
-            print(f"Single GIF generated successfully! Saved to {output_path}")
-        except ffmpeg.Error as e:
-            print(f"Conversion failed: {e.stderr.decode()}")
+        os.replace(temp_path, output_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def save_mp4_preview(frames, durations, output_path):
+    # H.264 needs a constant frame rate, so longer durations (the held last
+    # frame) are written as repeats of the shortest positive duration and
+    # zero-length frames (hold_last_frame=0) are dropped
+    positive_durations = [duration for duration in durations if duration > 0]
+    if not positive_durations:
+        raise ValueError("At least one frame needs a positive duration.")
+    base_duration = min(positive_durations)
+    width, height = frames[0].size
+    process = (
+        ffmpeg.input(
+            "pipe:",
+            format="rawvideo",
+            pix_fmt="rgb24",
+            s=f"{width}x{height}",
+            framerate=f"1000/{base_duration}",
+        )
+        .output(
+            str(output_path),
+            vcodec="libx264",
+            preset="veryfast",
+            pix_fmt="yuv420p",
+            vf="pad=ceil(iw/2)*2:ceil(ih/2)*2",  # yuv420p needs even dimensions
+            movflags="+faststart",
+        )
+        .global_args("-loglevel", "error")
+        .overwrite_output()
+        .run_async(pipe_stdin=True, pipe_stderr=True)
+    )
+    try:
+        for frame, duration in zip(frames, durations):
+            if duration <= 0:
+                continue
+            data = frame.convert("RGB").tobytes()
+            for _ in range(round(duration / base_duration)):
+                process.stdin.write(data)
+    except BrokenPipeError:
+        pass  # ffmpeg exited early, its stderr is reported below
+    finally:
+        # Always close and reap ffmpeg, even if writing the frames failed
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read()
+        returncode = process.wait()
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", None, stderr)
+
+
+def transcode_mp4_preview(
+    mp4_path, output_path, fps, scale, hold_last_frame, frame_duration
+):
+    # One ffmpeg pass: resample to fps, play each frame for frame_duration ms
+    # (setpts, then fps again so tpad sees the new rate) and clone the last
+    # frame so it stays on screen for hold_last_frame seconds in total
+    hold_extra = max(0.0, hold_last_frame - frame_duration / 1000)
+    ffmpeg.input(str(mp4_path), r=fps).output(
+        str(output_path),
+        vf=(
+            f"fps={fps},scale={scale}:-2:flags=lanczos,"
+            f"setpts=N*{frame_duration / 1000}/TB,fps=1000/{frame_duration},"
+            f"tpad=stop_mode=clone:stop_duration={hold_extra},"
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2"  # yuv420p needs even dimensions
+        ),
+        vcodec="libx264",
+        preset="veryfast",
+        pix_fmt="yuv420p",
+        movflags="+faststart",
+    ).run(quiet=True, overwrite_output=True)
+
+
+def gif_filter(fps, scale, colors):
+    # Single-pass palette generation so the GIF keeps its colors at low max_colors
+    return f"fps={fps},scale={scale}:-1:flags=lanczos,split[s0][s1];[s0]palettegen=max_colors={colors}[p];[s1][p]paletteuse=dither=bayer:bayer_scale=5"
 
 
 def load_frames_from_gif(gif_path, frame_duration, hold_last_frame):
@@ -181,29 +381,74 @@ def load_frames_from_gif(gif_path, frame_duration, hold_last_frame):
     return frames, durations, last_frame
 
 
+def scaled_size(mp4_path, scale):
+    # Output size for a width of scale, matching scale={scale}:-1
+    video_streams = [
+        stream
+        for stream in ffmpeg.probe(str(mp4_path))["streams"]
+        if stream["codec_type"] == "video"
+    ]
+    if not video_streams:
+        raise ValueError(f"No video stream found in {mp4_path}.")
+    width, height = int(video_streams[0]["width"]), int(video_streams[0]["height"])
+    return scale, max(1, round(height * scale / width))
+
+
+def load_frames_from_mp4(mp4_path, fps, scale, frame_duration, hold_last_frame):
+    # Decode straight to raw RGB on stdout, skipping the GIF palette passes and
+    # any intermediate image files; the size is fixed up front to split frames
+    width, height = scaled_size(mp4_path, scale)
+    out, _ = (
+        ffmpeg.input(str(mp4_path), r=fps)
+        .output(
+            "pipe:",
+            format="rawvideo",
+            pix_fmt="rgb24",
+            vf=f"fps={fps},scale={width}:{height}:flags=lanczos",
+        )
+        .run(quiet=True)
+    )
+
+    frame_size = width * height * 3
+    frames = [
+        Image.frombytes("RGB", (width, height), out[start : start + frame_size])
+        for start in range(0, len(out) - frame_size + 1, frame_size)
+    ]
+    if not frames:
+        return [], []
+
+    durations = [frame_duration] * len(frames)
+    durations[-1] = int(hold_last_frame * 1000)  # Set hold time for the last frame
+    return frames, durations
+
+
 def extract_frames_from_mp4(
-    mp4_path, fps, scale, colors, frame_duration, hold_last_frame
+    mp4_path, fps, scale, colors, frame_duration, hold_last_frame, format="gif"
 ):
-    with tempfile.NamedTemporaryFile(
-        suffix=".gif", delete=True
-    ) as temp_gif, tempfile.NamedTemporaryFile(
-        suffix=".png", delete=True
-    ) as last_frame_file:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=True) as last_frame_file:
 
         try:
-            ffmpeg.input(str(mp4_path), r=fps).output(
-                temp_gif.name,
-                vf=f"fps={fps},scale={scale}:-1:flags=lanczos,split[s0][s1];[s0]palettegen=max_colors={colors}[p];[s1][p]paletteuse=dither=bayer:bayer_scale=5",
-            ).run(quiet=True, overwrite_output=True)
+            if format == "gif":
+                with tempfile.NamedTemporaryFile(
+                    suffix=".gif", delete=True
+                ) as temp_gif:
+                    ffmpeg.input(str(mp4_path), r=fps).output(
+                        temp_gif.name,
+                        vf=gif_filter(fps, scale, colors),
+                    ).run(quiet=True, overwrite_output=True)
+
+                    frames, durations, last_frame = load_frames_from_gif(
+                        temp_gif.name, frame_duration, hold_last_frame
+                    )
+            else:
+                frames, durations = load_frames_from_mp4(
+                    mp4_path, fps, scale, frame_duration, hold_last_frame
+                )
 
             ffmpeg.input(str(mp4_path), ss="999999", r=1).output(
                 last_frame_file.name, vframes=1
             ).run(quiet=True, overwrite_output=True)
 
-            frames, durations, last_frame = load_frames_from_gif(
-                temp_gif.name, frame_duration, hold_last_frame
-            )
-
             # Load the last frame image
             with Image.open(last_frame_file.name) as img:
                 last_frame = img.copy()
@@ -215,17 +460,56 @@ def extract_frames_from_mp4(
             return [], [], None
 
 
+def benchmark_formats(
+    input_folder: str,
+    output_folder: str,
+    formats=("gif", "webp", "apng", "mp4"),
+    **kwargs,
+):
+    # Run mp4_to_gif once per format (kwargs are passed through) and report
+    # encode time and total output bytes, each format in its own subfolder
+    output_folder = Path(output_folder)
+    results = []
+    for format in formats:
+        start = time.perf_counter()
+        output_paths = mp4_to_gif(
+            input_folder, output_folder / format, format=format, **kwargs
+        )
+        elapsed = time.perf_counter() - start
+        total_bytes = sum(os.path.getsize(path) for path in output_paths)
+        results.append((format, elapsed, total_bytes, len(output_paths)))
+
+    print(f"{'format':<8}{'files':>8}{'time (s)':>12}{'bytes':>14}")
+    for format, elapsed, total_bytes, n_files in results:
+        print(f"{format:<8}{n_files:>8}{elapsed:>12.2f}{total_bytes:>14}")
+    return results
+
+
 # Example code
-mp4_to_gif(
-    input_folder="/home/qiao/Projects/pytools/data/gdn_grasps",  # Path to input MP4 folder
-    output_folder="/home/qiao/Projects/pytools/output/gifs/gdn_grasps",  # Path to output GIF folder
-    fps=5,
-    scale=320,
-    colors=128,
-    loop=0,
-    hold_last_frame=0.5,
-    frame_duration=20,
-    generate_individual=False,  # True for individual GIFs, False for merged grid GIF
-    rows=4,
-    cols=6,
-)
+if __name__ == "__main__":
+    mp4_to_gif(
+        input_folder="/home/qiao/Projects/pytools/data/gdn_grasps",  # Path to input MP4 folder
+        output_folder="/home/qiao/Projects/pytools/output/gifs/gdn_grasps",  # Path to output GIF folder
+        fps=5,
+        scale=320,
+        colors=128,
+        loop=0,
+        hold_last_frame=0.5,
+        frame_duration=20,
+        generate_individual=False,  # True for individual GIFs, False for merged grid GIF
+        rows=4,
+        cols=6,
+        format="gif",  # "gif", "webp", "apng" or "mp4" (H.264 preview)
+    )
+
+    # Compare encode time and size of every format on the same input
+    # benchmark_formats(
+    #     input_folder="/home/qiao/Projects/pytools/data/gdn_grasps",
+    #     output_folder="/home/qiao/Projects/pytools/output/benchmark/gdn_grasps",
+    #     fps=5,
+    #     scale=320,
+    #     hold_last_frame=0.5,
+    #     generate_individual=False,
+    #     rows=4,
+    #     cols=6,
+    # )
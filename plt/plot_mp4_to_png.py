@@ -173,7 +173,9 @@ def process_folder(
         compose_images(folder_path, all_images, max_images, output_dir)
 
 
-def compose_images(folder_path, image_paths, max_images=None, output_dir=None):
+def compose_images(
+    folder_path, image_paths, max_images=None, output_dir=None, output_name=None
+):
     # Create the 'images_compose' folder inside the 'images' folder, unless output_dir is provided
     if output_dir is None:
         images_dir = os.path.join(folder_path, "images")
@@ -203,14 +205,18 @@ def compose_images(folder_path, image_paths, max_images=None, output_dir=None):
         composed_image.paste(img, (0, y_offset))
         y_offset += img.height
 
-    # Save the final composed image
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    composed_image_path = os.path.join(
-        images_compose_dir, f"composed_image_{len(images)}_images_{timestamp}.png"
-    )
-    composed_image.save(composed_image_path)
+    # Save the final composed image, overwriting output_name in place if given
+    if output_name is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_name = f"composed_image_{len(images)}_images_{timestamp}.png"
+    composed_image_path = os.path.join(images_compose_dir, output_name)
+    # Save next to the target and swap it in, so readers never see a partial file
+    temp_path = os.path.join(images_compose_dir, f".{os.getpid()}.{output_name}")
+    composed_image.save(temp_path, format="PNG")
+    os.replace(temp_path, composed_image_path)
 
     print(f"Composed image saved to: {composed_image_path}")
+    return composed_image_path
 
 
 # Example usage
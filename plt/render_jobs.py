@@ -0,0 +1,309 @@
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from plot_mp4_to_gif import convert_single_mp4_to_gif
+from plot_mp4_to_png import extract_and_concatenate_frames
+
+# A job directory holds one JSON file per MP4, moved between these folders with
+# os.rename, which is atomic on a shared filesystem. Claimed files are named
+# "<key>.json.<worker>", so each claim is distinct even after a re-queue.
+# keys/ holds one never-removed file per job, so each job is created only once.
+JOB_STATES = ("pending", "claimed", "done", "failed")
+
+
+def create_manifest(
+    job_dir: str,
+    input_folder: str,
+    output_folder: str,
+    mode: str = "gif",
+    retry_failed: bool = True,
+    **options,
+):
+    """
+    Add one job per MP4 in input_folder to a job directory.
+
+    Calling it again on the same folder only adds MP4s that were never added, so
+    an interrupted batch can be resumed or extended. Each job is first reserved
+    by exclusively creating keys/<key>, which is never removed; only the caller
+    whose reservation succeeds publishes it to pending, so every worker can call
+    this on the same job directory without creating a job twice. If a caller
+    crashes between reserving and publishing, delete keys/<key> to add it again.
+
+    Parameters:
+    - job_dir: str, shared directory that holds the job manifest.
+    - input_folder: str, folder containing the MP4 files to render.
+    - output_folder: str, folder the rendered files are written to.
+    - mode: str, "gif" for convert_single_mp4_to_gif, "png" for extract_and_concatenate_frames.
+    - retry_failed: bool, move jobs in failed/ back to pending before adding new ones.
+    - options: keyword arguments for the render function, e.g. fps, scale or format for "gif", n or layout for "png".
+    """
+    if mode not in ("gif", "png"):
+        raise ValueError("Invalid mode. Choose 'gif' or 'png'.")
+
+    job_dir = Path(job_dir)
+    for state in JOB_STATES + ("keys",):
+        (job_dir / state).mkdir(parents=True, exist_ok=True)
+
+    if retry_failed:
+        requeue_failed_jobs(job_dir)
+
+    # Job directories from before keys/ existed only have their state folders
+    known = {
+        job_path.name.split(".json")[0]
+        for state in JOB_STATES
+        for job_path in (job_dir / state).iterdir()
+    }
+
+    added = skipped = 0
+    for mp4_file in sorted(Path(input_folder).glob("*.mp4")):
+        key = mp4_file.stem
+        if key in known:
+            skipped += 1
+            continue
+        job = {
+            "mp4": str(mp4_file.resolve()),
+            "output_folder": str(Path(output_folder).resolve()),
+            "mode": mode,
+            "options": options,
+        }
+        # Write a private temp file first so workers never read a partial job
+        temp_path = job_dir / f".{key}.json.{os.getpid()}-{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(job, f)
+        try:
+            # os.link fails if the target exists, so exactly one caller wins
+            os.link(temp_path, job_dir / "keys" / key)
+            os.link(temp_path, job_dir / "pending" / f"{key}.json")
+            added += 1
+        except FileExistsError:
+            skipped += 1  # Reserved by another caller
+        finally:
+            os.unlink(temp_path)
+
+    print(f"Added {added} jobs to {job_dir}, skipped {skipped} known jobs.")
+    return added
+
+
+def requeue_failed_jobs(job_dir):
+    job_dir = Path(job_dir)
+    requeued = 0
+    for failed_path in (job_dir / "failed").glob("*.json"):
+        try:
+            os.rename(failed_path, job_dir / "pending" / failed_path.name)
+            requeued += 1
+        except FileNotFoundError:
+            continue  # Re-queued by another caller meanwhile
+    if requeued:
+        print(f"Re-queued {requeued} failed jobs.")
+    return requeued
+
+
+def run_worker(
+    job_dir: str,
+    lease_seconds: float = 60.0,
+    poll_interval: float = 2.0,
+    worker_id: str = None,
+):
+    """
+    Claim and render jobs until no pending or claimed jobs are left.
+
+    While rendering, the worker refreshes the mtime of its claimed file every
+    lease_seconds / 3. A claim whose mtime is older than lease_seconds belongs to a
+    crashed worker and is moved back to pending by whichever worker sees it first.
+    Ages are measured against a probe file touched in job_dir, so all mtimes come
+    from the shared filesystem's clock and workers' local clocks need not agree.
+
+    Parameters:
+    - job_dir: str, job directory created by create_manifest.
+    - lease_seconds: float, time without a heartbeat after which a claim is re-queued.
+    - poll_interval: float, seconds to wait while other workers still hold claims.
+    - worker_id: str or None, name recorded in the claim; defaults to "<hostname>-<pid>".
+    """
+    job_dir = Path(job_dir)
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    completed = 0
+    while True:
+        requeue_expired_jobs(job_dir, lease_seconds)
+        claimed_path = claim_job(job_dir, worker_id)
+        if claimed_path is None:
+            if not any((job_dir / "claimed").iterdir()):
+                break
+            # Other workers are still busy, wait in case one of them crashes
+            time.sleep(poll_interval)
+            continue
+
+        if run_job(claimed_path, lease_seconds, worker_id):
+            completed += 1
+
+    print(f"Worker {worker_id} finished, completed {completed} jobs.")
+    return completed
+
+
+def run_workers(job_dir: str, num_workers: int = 4, lease_seconds: float = 60.0):
+    # Run several workers as local processes against the same job directory
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(job_dir, lease_seconds))
+        for _ in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def claim_job(job_dir, worker_id):
+    for pending_path in sorted((job_dir / "pending").glob("*.json")):
+        claimed_path = job_dir / "claimed" / f"{pending_path.name}.{worker_id}"
+        try:
+            # Start the lease before the rename, so the claim never shows up in
+            # claimed/ with the old mtime from manifest creation
+            os.utime(pending_path)
+            os.rename(pending_path, claimed_path)
+        except FileNotFoundError:
+            continue  # Another worker claimed it first
+        return claimed_path
+    return None
+
+
+def filesystem_now(job_dir):
+    # Current time on the filesystem's clock: touch a per-process probe file the
+    # same way heartbeats touch claims and read back its mtime
+    probe_path = job_dir / f".clock-{socket.gethostname()}-{os.getpid()}"
+    probe_path.touch()
+    os.utime(probe_path)
+    return probe_path.stat().st_mtime
+
+
+def requeue_expired_jobs(job_dir, lease_seconds):
+    now = filesystem_now(job_dir)
+    for claimed_path in (job_dir / "claimed").iterdir():
+        try:
+            expired = now - claimed_path.stat().st_mtime > lease_seconds
+            if expired:
+                key = claimed_path.name.split(".json")[0]
+                os.rename(claimed_path, job_dir / "pending" / f"{key}.json")
+                print(f"Re-queued expired job: {claimed_path.name}")
+        except FileNotFoundError:
+            continue  # Finished or re-queued by another worker meanwhile
+
+
+def run_job(claimed_path, lease_seconds, worker_id):
+    job_dir = claimed_path.parent.parent
+    key = claimed_path.name.split(".json")[0]
+    try:
+        with open(claimed_path) as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        print(f"Lost claim on {key} before it started.")
+        return False
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat,
+        args=(claimed_path, lease_seconds / 3, stop_heartbeat),
+        daemon=True,
+    )
+    heartbeat.start()
+
+    start = time.time()
+    try:
+        output_path = render_job(job)
+        error = None if output_path else "render returned no output"
+    except Exception as e:
+        output_path, error = None, str(e)
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+    job.update(
+        worker=worker_id,
+        output=str(output_path) if output_path else None,
+        error=error,
+        started=start,
+        elapsed=time.time() - start,
+    )
+    state = "done" if error is None else "failed"
+    record_path = job_dir / state / f"{key}.json"
+    try:
+        os.rename(claimed_path, record_path)
+    except FileNotFoundError:
+        # Our lease expired and the job was re-queued; the new claim will record it
+        print(f"Lease for {key} was lost before the job was recorded.")
+        return False
+
+    temp_path = job_dir / state / f".{key}.json.{worker_id}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(job, f)
+    os.replace(temp_path, record_path)
+
+    print(f"Job {key} {state} in {job['elapsed']:.1f}s: {job['output'] or error}")
+    return error is None
+
+
+def render_job(job):
+    mp4_path = Path(job["mp4"])
+    output_folder = Path(job["output_folder"])
+    output_folder.mkdir(parents=True, exist_ok=True)
+    options = job["options"]
+
+    if job["mode"] == "gif":
+        return convert_single_mp4_to_gif(
+            mp4_path,
+            output_folder,
+            options.get("fps", 10),
+            options.get("scale", 320),
+            options.get("colors", 128),
+            options.get("loop", 0),
+            options.get("hold_last_frame", 1.0),
+            options.get("frame_duration", 20),
+            options.get("format", "gif"),
+        )
+
+    image_path = extract_and_concatenate_frames(
+        str(mp4_path),
+        options.get("n", 10),
+        options.get("decay_factor", 1.0),
+        False,
+        options.get("layout", "horizontal"),
+    )
+    if image_path is None:
+        return None
+    # extract_and_concatenate_frames saves a timestamped file next to the video;
+    # move it to a fixed name so a re-run job replaces its output
+    output_path = output_folder / f"{mp4_path.stem}_concatenated.png"
+    shutil.move(image_path, output_path)
+    return output_path
+
+
+def _heartbeat(claimed_path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            os.utime(claimed_path)
+        except FileNotFoundError:
+            return  # Claim was re-queued, nothing left to refresh
+
+
+# Example usage
+if __name__ == "__main__":
+    job_dir = "/home/qiao/Projects/pytools/output/jobs/gdn_grasps"
+
+    # Can be run from every worker: jobs that already exist are skipped
+    create_manifest(
+        job_dir,
+        input_folder="/home/qiao/Projects/pytools/data/gdn_grasps",
+        output_folder="/home/qiao/Projects/pytools/output/gifs/gdn_grasps",
+        mode="gif",
+        fps=5,
+        scale=320,
+        hold_last_frame=0.5,
+    )
+    run_workers(job_dir, num_workers=4, lease_seconds=60.0)
@@ -1,30 +1,93 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import socket
+import time
 
 
-def log_time(label, time_elapsed):
+def log_time(label, time_elapsed, shard_dir=None, run_id="default"):
     """
     Append timing data to a file.
 
+    With shard_dir set, every process appends to its own shard file in shard_dir,
+    so parallel workers never write to the same file. Each shard line records the
+    timestamp, run, process and label; read_time_shards merges them again.
+
     Parameters:
-    - file_path: str, path to the log file.
     - label: str, description of the timing data.
     - time_elapsed: float, the elapsed time to log.
+    - shard_dir: str or None, directory for per-process shards; None appends to the single shared log file.
+    - run_id: str, name of the run the sample belongs to, used to group shards when merging.
+
+    In shard mode a label containing tabs or line breaks, or a run_id that also
+    contains path separators, raises ValueError instead of writing a line that
+    read_time_shards would drop.
     """
-    file_path = "/home/qiao/Projects/pytools/data/time_take/se3dif_grasp_timing_log.txt"
+    if shard_dir is None:
+        file_path = "/home/qiao/Projects/pytools/data/time_take/se3dif_grasp_timing_log.txt"
+        line = f"{label}: {time_elapsed}\n"
+    else:
+        # Shard lines are tab-separated and run_id is part of the file name
+        if any(c in label for c in "\t\r\n"):
+            raise ValueError("label must not contain tabs or line breaks.")
+        if (
+            not run_id
+            or run_id in (".", "..")
+            or any(c in run_id for c in "\t\r\n/\\")
+        ):
+            raise ValueError(
+                "run_id must be a non-empty name without tabs, line breaks or path separators."
+            )
+        os.makedirs(shard_dir, exist_ok=True)
+        process = f"{socket.gethostname()}-{os.getpid()}"
+        file_path = os.path.join(shard_dir, f"{run_id}-{process}.shard")
+        line = f"{time.time()}\t{run_id}\t{process}\t{label}\t{time_elapsed}\n"
+
     with open(file_path, "a") as f:  # Open in append mode
-        f.write(f"{label}: {time_elapsed}\n")  # Write timing data
+        f.write(line)  # Write timing data
     print("%" * 50, "saved timing data to", file_path)
 
 
+def read_time_shards(shard_dir, selected_labels=None):
+    """
+    Merge the shard files written by log_time into one time series per run.
+
+    Parameters:
+    - shard_dir: str, directory containing .shard files.
+    - selected_labels: list of str or None, specifies which timing labels to use; if None, all labels are used.
+
+    Returns:
+    - dict mapping run id to a numpy array of times, ordered by the time they were logged.
+    """
+    samples = {}
+    for file_name in sorted(os.listdir(shard_dir)):
+        if not file_name.endswith(".shard"):
+            continue
+        with open(os.path.join(shard_dir, file_name), "r") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                # Skip a last line cut short by a crashed process
+                if not line.endswith("\n") or len(fields) != 5:
+                    continue
+                timestamp, run_id, process, label, time_str = fields
+                if selected_labels is None or label in selected_labels:
+                    samples.setdefault(run_id, []).append(
+                        (float(timestamp), float(time_str))
+                    )
+
+    return {
+        run_id: np.array([time_value for _, time_value in sorted(run_samples)])
+        for run_id, run_samples in sorted(samples.items())
+    }
+
+
 def plot_time_statistics(input_path, selected_labels=None, layout="horizontal"):
     """
     Reads timing data from a single text file or multiple text files in a directory,
     and plots average and cumulative timing statistics for selected time labels.
 
     Parameters:
-    - input_path: str, the absolute path to a txt timing file or a directory containing multiple txt timing files.
+    - input_path: str, the absolute path to a txt timing file or a directory containing multiple txt timing files and/or shard files from log_time.
     - selected_labels: list of str or None, specifies which timing labels to use; if None, all labels are used.
     - layout: str, "horizontal" for side-by-side subplots, "vertical" for top-bottom subplots.
     """
@@ -78,6 +141,13 @@ def plot_time_statistics(input_path, selected_labels=None, layout="horizontal"):
             time_data.append(np.array(file_times))
             min_length = min(min_length, len(file_times))
 
+    # Shards from log_time(..., shard_dir=...) are merged into one series per run
+    if os.path.isdir(input_path):
+        for run_id, run_times in read_time_shards(input_path, selected_labels).items():
+            model_names.append(run_id)
+            time_data.append(run_times)
+            min_length = min(min_length, len(run_times))
+
     # Trim each time series to the minimum length
     time_data = [times[:min_length] for times in time_data]
 
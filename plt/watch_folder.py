@@ -0,0 +1,276 @@
+import asyncio
+from pathlib import Path
+
+from plot_mp4_to_gif import (
+    FORMAT_SUFFIXES,
+    encode_single_mp4,
+    load_frames_from_mp4,
+    save_merged_gif,
+)
+from plot_mp4_to_png import compose_images, extract_and_concatenate_frames
+
+
+def watch_folder(
+    input_folder: str,
+    output_folder: str,
+    mode: str = "gif",
+    fps: int = 10,
+    scale: int = 320,
+    colors: int = 128,
+    loop: int = 0,
+    hold_last_frame: float = 1.0,
+    frame_duration: int = 20,
+    format: str = "gif",
+    rows: int = None,
+    cols: int = None,
+    n: int = 10,
+    decay_factor: float = 1.0,
+    layout: str = "horizontal",
+    max_images: int = None,
+    max_workers: int = 2,
+    queue_size: int = 4,
+    poll_interval: float = 1.0,
+    idle_timeout: float = None,
+):
+    """
+    Watch a folder for finished MP4 files and render them as they arrive.
+
+    An MP4 is considered finished once its size and mtime stay unchanged for one
+    poll interval, which also covers files that are renamed into place. Ready files
+    go through a bounded queue to at most max_workers concurrent renders; when the
+    queue is full the scanner waits, so a burst of new files cannot pile up
+    unbounded ffmpeg processes. Composite outputs are rebuilt after every render
+    and swapped in atomically, so a dashboard polling them never reads a partial file.
+
+    Parameters:
+    - input_folder: str, folder the producer writes MP4 files into.
+    - output_folder: str, folder for individual GIFs (mode "gif") or composed PNGs (mode "png").
+    - mode: str, "gif" to convert each MP4 to an animation, "png" to build frame strips like process_folder.
+    - fps, scale, colors, loop, hold_last_frame, frame_duration, format: animation options, see mp4_to_gif.
+    - rows, cols: int or None, if both set in mode "gif", also keep a merged grid of the latest rows x cols videos up to date; cells stay empty until enough videos arrived.
+    - n, decay_factor, layout, max_images: PNG options, see process_folder.
+    - max_workers: int, maximum number of renders running at once.
+    - queue_size: int, maximum number of ready files waiting for a worker.
+    - poll_interval: float, seconds between folder scans.
+    - idle_timeout: float or None, stop after this many seconds without new files; None watches forever.
+    """
+    if mode not in ("gif", "png"):
+        raise ValueError("Invalid mode. Choose 'gif' or 'png'.")
+    if format not in FORMAT_SUFFIXES:
+        raise ValueError(
+            f"Invalid format. Choose one of {', '.join(FORMAT_SUFFIXES)}."
+        )
+
+    options = dict(
+        mode=mode,
+        fps=fps,
+        scale=scale,
+        colors=colors,
+        loop=loop,
+        hold_last_frame=hold_last_frame,
+        frame_duration=frame_duration,
+        format=format,
+        rows=rows,
+        cols=cols,
+        n=n,
+        decay_factor=decay_factor,
+        layout=layout,
+        max_images=max_images,
+    )
+    try:
+        asyncio.run(
+            _watch(
+                Path(input_folder),
+                Path(output_folder),
+                options,
+                max_workers,
+                queue_size,
+                poll_interval,
+                idle_timeout,
+            )
+        )
+    except KeyboardInterrupt:
+        print("Stopped watching", input_folder)
+
+
+async def _watch(
+    input_folder,
+    output_folder,
+    options,
+    max_workers,
+    queue_size,
+    poll_interval,
+    idle_timeout,
+):
+    output_folder.mkdir(parents=True, exist_ok=True)
+    queue = asyncio.Queue(maxsize=queue_size)
+    state = {
+        "grid_frames": {},  # mp4 path -> (frames, durations), oldest first
+        "strips": {},  # mp4 path -> rendered PNG strip
+        "lock": asyncio.Lock(),  # serializes composite rebuilds
+    }
+
+    workers = [
+        asyncio.create_task(_worker(queue, output_folder, options, state))
+        for _ in range(max_workers)
+    ]
+    try:
+        await _scan(input_folder, queue, poll_interval, idle_timeout)
+        await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _scan(input_folder, queue, poll_interval, idle_timeout):
+    last_seen = {}  # path -> (size, mtime) from the previous scan
+    rendered = {}  # path -> (size, mtime) that was queued, so rewritten files render again
+    idle = 0.0
+
+    while idle_timeout is None or idle < idle_timeout:
+        current = {}
+        for mp4_file in input_folder.glob("*.mp4"):
+            try:
+                stat = mp4_file.stat()
+            except FileNotFoundError:
+                continue  # Renamed or removed between glob and stat
+            current[mp4_file] = (stat.st_size, stat.st_mtime)
+
+        found_new = False
+        for mp4_file in sorted(current):
+            signature = current[mp4_file]
+            if signature[0] == 0 or rendered.get(mp4_file) == signature:
+                continue
+            if last_seen.get(mp4_file) == signature:
+                rendered[mp4_file] = signature
+                found_new = True
+                print(f"Queued finished video: {mp4_file}")
+                await queue.put(mp4_file)  # Blocks while all workers are busy
+            else:
+                found_new = True  # Still being written, keep the watcher alive
+
+        last_seen = current
+        idle = 0.0 if found_new else idle + poll_interval
+        await asyncio.sleep(poll_interval)
+
+
+async def _worker(queue, output_folder, options, state):
+    while True:
+        mp4_file = await queue.get()
+        try:
+            if options["mode"] == "gif":
+                await _render_gif(mp4_file, output_folder, options, state)
+            else:
+                await _render_png(mp4_file, output_folder, options, state)
+        except Exception as e:
+            print(f"Rendering {mp4_file} failed: {e}")
+        finally:
+            queue.task_done()
+
+
+async def _render_gif(mp4_file, output_folder, options, state):
+    format = options["format"]
+    output_path = output_folder / f"{mp4_file.stem}{FORMAT_SUFFIXES[format]}"
+    # ffmpeg and PIL block, so encode in a thread; the worker count still
+    # bounds how many encodes run at once
+    frames, durations = await asyncio.to_thread(
+        encode_single_mp4,
+        mp4_file,
+        output_path,
+        options["fps"],
+        options["scale"],
+        options["colors"],
+        options["loop"],
+        options["hold_last_frame"],
+        options["frame_duration"],
+        format,
+    )
+    print(f"Single {format.upper()} generated successfully! Saved to {output_path}")
+
+    rows, cols = options["rows"], options["cols"]
+    if not rows or not cols:
+        return
+
+    if frames is None:
+        # MP4 previews are transcoded directly, decode frames for the grid
+        frames, durations = await asyncio.to_thread(
+            load_frames_from_mp4,
+            mp4_file,
+            options["fps"],
+            options["scale"],
+            options["frame_duration"],
+            options["hold_last_frame"],
+        )
+        if not frames:
+            return
+
+    async with state["lock"]:
+        # The grid shows the latest rows*cols videos, a rewritten video counts
+        # as new; older ones are evicted so memory stays bounded
+        grid_frames = state["grid_frames"]
+        grid_frames.pop(mp4_file, None)
+        grid_frames[mp4_file] = (frames, durations)
+        while len(grid_frames) > rows * cols:
+            del grid_frames[next(iter(grid_frames))]
+
+        # Only the new video was decoded, the grid is re-pasted from cached frames
+        output_folder_merge = output_folder / "merge"
+        output_folder_merge.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(
+            save_merged_gif,
+            [cached[0] for cached in grid_frames.values()],
+            [cached[1] for cached in grid_frames.values()],
+            output_folder_merge,
+            options["loop"],
+            options["hold_last_frame"],
+            rows,
+            cols,
+            format,
+        )
+
+
+async def _render_png(mp4_file, output_folder, options, state):
+    # Frame strips are read with OpenCV, so run them off the event loop
+    image_path = await asyncio.to_thread(
+        extract_and_concatenate_frames,
+        str(mp4_file),
+        options["n"],
+        options["decay_factor"],
+        False,
+        options["layout"],
+    )
+    if not image_path:
+        return
+
+    async with state["lock"]:
+        state["strips"][mp4_file] = image_path
+        image_paths = [state["strips"][f] for f in sorted(state["strips"])]
+        await asyncio.to_thread(
+            compose_images,
+            str(mp4_file.parent),
+            image_paths,
+            options["max_images"],
+            str(output_folder),
+            "composed_image_latest.png",
+        )
+
+
+# Example usage
+if __name__ == "__main__":
+    input_folder = "/home/qiao/Projects/GraspDiffusionNetwork/grasp_diffusion_network/scripts/eval/checkpoints_evaluations_trash/GraspGeneratorDiffusionEuclidean/1730121411/grasp_generation_animations"
+    output_folder = "/home/qiao/Projects/pytools/output/gifs/watch"
+
+    watch_folder(
+        input_folder,
+        output_folder,
+        mode="gif",  # "gif" for animations (plus merged grid), "png" for composed frame strips
+        format="gif",  # "gif", "webp", "apng" or "mp4" (H.264 preview)
+        fps=5,
+        scale=320,
+        hold_last_frame=0.5,
+        rows=4,
+        cols=6,
+        max_workers=4,  # Number of concurrent ffmpeg renders
+        idle_timeout=None,  # Watch until interrupted
+    )